@@ -0,0 +1,124 @@
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import Counter, deque
+from messages import Messages, DecayedMessages
+
+EMOTES = ["KEKW", "LUL", "OMEGALUL", "Pog", "PogChamp", "monkaS", "Kappa", "W", "L", "D:"]
+
+# name: (scoring, raid users, messages)
+# window & baseline queue length is the raid user count, decayed half-life is a quarter of it
+# baseline rescans every chatter per message, so it only runs the smaller raid
+CASES = {
+    "baseline 3k": ("baseline", 3000, 6000),
+    "window 3k": ("window", 3000, 6000),
+    "window 20k": ("window", 20000, 40000),
+    "decayed 3k": ("decayed", 3000, 6000),
+    "decayed 20k": ("decayed", 20000, 40000),
+}
+
+class BaselineMessages:
+    """
+    Window scoring with the original layout: every user has a Counter of words
+    and NPC-word is found by rescanning every user's words after each message.
+    """
+
+    SAME_WORD_THRESHOLD = 75
+    SAME_FREQ_THRESHOLD = 75
+
+    def __init__(self, queue_length: int):
+        self.message_queue = deque(maxlen=queue_length)
+        self.word_counts: dict[str, Counter] = {}
+
+    def add(self, user: str, message: str):
+        if len(self.message_queue) == self.message_queue.maxlen:
+            old_user, old_words = self.message_queue.pop()
+            old_word_counts = self.word_counts[old_user]
+            old_word_counts -= Counter(old_words)
+            if len(old_word_counts) < 1:
+                self.word_counts.pop(old_user)
+
+        words = message.split()
+        user_word_counts = self.word_counts.setdefault(user, Counter())
+        user_word_counts += Counter(words)
+        self.message_queue.appendleft((user, words))
+        self.update_npc_word()
+
+    def update_npc_word(self):
+        unique_words = Counter()
+        for user_word_counts in self.word_counts.values():
+            unique_words.update(user_word_counts.keys())
+
+        most_common = unique_words.most_common()
+        self.npc_word, self.npc_word_count = most_common[0]
+        self.npc_word_mfc = self.calculate_word_frequency(self.npc_word)
+        for word, count in most_common[1:]:
+            if (self.SAME_WORD_THRESHOLD / 100) <= (count / self.npc_word_count):
+                if (self.SAME_FREQ_THRESHOLD / 100) <= (self.calculate_word_frequency(word) / self.npc_word_mfc):
+                    self.npc_word += f" {word}"
+
+    def calculate_word_frequency(self, word: str) -> int:
+        word_counts = Counter(
+            user_word_counts[word] for user_word_counts in self.word_counts.values() if word in user_word_counts
+        )
+        return max(word_counts, key=word_counts.get)
+
+def raid_messages(user_count: int, message_count: int, seed: int = 0) -> list[tuple[str, str]]:
+    """Raid-like chat: every user sends at least once, messages are 1-4 emotes."""
+    randomizer = random.Random(seed)
+    messages = []
+    for index in range(message_count):
+        user = f"raider_{index % user_count}" if index < user_count else f"raider_{randomizer.randrange(user_count)}"
+        words = ' '.join(randomizer.choice(EMOTES) for _ in range(randomizer.randint(1, 4)))
+        messages.append((user, words))
+    return messages
+
+def benchmark(name: str):
+    """
+    Logs time per added message and memory per unique chatter once all messages are added.
+    Strings are interned before measuring, so only the message state is counted.
+    """
+    scoring, user_count, message_count = CASES[name]
+    messages = [(sys.intern(user), message) for user, message in raid_messages(user_count, message_count)]
+    for emote in EMOTES:
+        sys.intern(emote)
+    if scoring == "baseline":
+        chat_messages = BaselineMessages(user_count)
+    elif scoring == "window":
+        chat_messages = Messages(user_count)
+    else:
+        chat_messages = DecayedMessages(user_count // 4)
+
+    tracemalloc.start()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+
+    for user, message in messages:
+        chat_messages.add(user, message)
+
+    elapsed = time.perf_counter() - start_time
+    memory = tracemalloc.get_traced_memory()[0] - start_memory
+    tracemalloc.stop()
+
+    # decayed scoring's unique chatters are effective, memory is divided by every tracked chatter
+    if scoring == "baseline":
+        tracked_chatters = len(chat_messages.word_counts)
+    elif scoring == "window":
+        tracked_chatters = len(chat_messages.user_ids)
+    else:
+        tracked_chatters = len(chat_messages.user_weights)
+    print(
+        f"{name:<12} {elapsed / len(messages) * 1e6:8.1f} us/message "
+        f"{memory / max(1, tracked_chatters):8.0f} B/chatter "
+        f"({tracked_chatters} chatters)"
+    )
+
+if __name__ == "__main__":
+    if 1 < len(sys.argv):
+        benchmark(sys.argv[1])
+    else:
+        # every case runs in a fresh process so that cases don't share allocations
+        for name in CASES:
+            subprocess.run([sys.executable, __file__, name], check=True)
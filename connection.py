@@ -7,7 +7,10 @@ import os
 import random
 import logging
 import requests
-from messages import Messages
+from collections import OrderedDict
+from messages import Messages, DecayedMessages
+from snapshot import Snapshot
+from history import NPCHistory
 from dotenv import load_dotenv
 
 # loads .env variables
@@ -32,6 +35,8 @@ class TwitchConnection:
     max_same_message_count  = 1
     sub_emotes_enabled      = False
     follower_emotes_enabled = True
+    decay_half_life         = 10
+    decay_time_based        = False
 
     def __init__(self):
         self.oauth = os.environ.get("OAUTH_TOKEN_TWITCH")
@@ -39,11 +44,24 @@ class TwitchConnection:
         self.chat = os.environ.get("CHAT")
         self.client_id = os.environ.get("CLIENT_ID")
         self.thread_lock = threading.Lock()
+        self.messages_lock = threading.Lock()   # guards chat messages between receiving, terminal & snapshot threads
         self.chat_messages = Messages()
+        self.history = NPCHistory(self.chat)
+        self.chat_commands = {
+            "NPC": ChatCommand(
+                self.format_npc_meter_reply, "responds with current NPC-meter", self.get_npc_meter_values,
+                user_cooldown=30, global_cooldown=5, cache_time=60
+            ),
+        }
 
         self.broadcaster_id = self.get_broadcaster_id()
         self.channel_sub_emotes, self.channel_follower_emotes = self.get_channel_emotes(self.broadcaster_id)
 
+        # restores previous state and keeps saving it in the background
+        self.snapshot = Snapshot(self)
+        self.snapshot.load()
+        self.snapshot.start()
+
     def connect(self):
         """Creates SSL socket, tries to establish SSL connection to the server, authenticate and join a chat."""
         if self.is_connected():
@@ -122,7 +140,7 @@ class TwitchConnection:
         match command:
             case "PRIVMSG":
                 logging.debug(f"{user}: {parameters}")
-                self.handle_bot_command(parameters)
+                self.handle_bot_command(user, parameters)
                 self.handle_npc_messages(user, parameters)
             case "PING":
                 # keep-alive message
@@ -201,34 +219,60 @@ class TwitchConnection:
 
         return nick, host, command, parameters
     
-    def handle_bot_command(self, parameters: str):
+    def handle_bot_command(self, user: str, parameters: str):
         """Checks if the message is bot command, parses command part and executes command if found."""
-        if parameters[0] == self.CHAT_COMMAND_SYMBOL:
-            # parses command part
-            command_end = parameters.find(' ')
-            if command_end < 0:
-                command_end = len(parameters)
-            bot_command = parameters[1:command_end].upper()
-        else:
+        if parameters[0] != self.CHAT_COMMAND_SYMBOL:
             return
 
-        match bot_command:
-            case "NPC":
-                npc_meter = self.chat_messages.howNPC()
-                formatted_npc_meter = "{:.1f}".format(npc_meter) # decimal accuracy
-                unique_chatters = self.chat_messages.get_unique_chatters()
-                self.send_chat_message(f"NPC-meter: {formatted_npc_meter}% (last {unique_chatters} unique chatters)")
-            case _:
-                pass
+        # parses command part
+        command_end = parameters.find(' ')
+        if command_end < 0:
+            command_end = len(parameters)
+        bot_command = self.chat_commands.get(parameters[1:command_end].upper())
+
+        if bot_command is None:
+            return
+
+        # cooldowns start only if the reply isn't dropped by bot message limits
+        reply = bot_command.execute(user)
+        if reply and self.send_chat_message(reply):
+            bot_command.start_cooldowns(user)
+
+    def get_npc_meter_values(self) -> tuple[str, int]:
+        formatted_npc_meter = "{:.1f}".format(self.chat_messages.howNPC()) # decimal accuracy
+        return formatted_npc_meter, self.chat_messages.get_unique_chatters()
+
+    def format_npc_meter_reply(self, formatted_npc_meter: str, unique_chatters: int) -> str:
+        return f"NPC-meter: {formatted_npc_meter}% (last {unique_chatters} unique chatters)"
 
     def handle_npc_messages(self, user: str, parameters: str):
         """Adds message to queue, reacts to NPC-alert if NPC-messages are enabled."""
-        threshold_crossed = self.chat_messages.add(user, parameters)
-
-        # sends NPC-message if threshold is crossed and NPC-messages enabled
-        if threshold_crossed and self.npc_response_enabled:
-            self.send_chat_message(self.chat_messages.get_npc_message())
-            self.chat_messages.clear()
+        with self.messages_lock:
+            threshold_crossed = self.chat_messages.add(user, parameters)
+            self.record_history(threshold_crossed)
+
+            # sends NPC-message if threshold is crossed and NPC-messages enabled
+            if threshold_crossed and self.npc_response_enabled:
+                self.send_chat_message(self.chat_messages.get_npc_message())
+                self.chat_messages.clear()
+
+    def record_history(self, npc_alert: bool):
+        """Appends current NPC-meter state to history."""
+        self.history.append(
+            time.time(),
+            self.chat_messages.howNPC(),
+            self.chat_messages.get_npc_word(),
+            self.chat_messages.get_unique_chatters(),
+            npc_alert
+        )
+
+    def get_history_peaks(self, hours: int) -> list[tuple[float, tuple, int]]:
+        """Returns hourly NPC-meter peaks and alert counts from the last given hours."""
+        end = time.time()
+        return self.history.peaks(end - hours * 3600, end, 3600)
+
+    def close_history(self):
+        self.history.close()
 
     def send_server_message(self, message: str):
         """Sends message to server. Ends every line with CR + LF."""
@@ -239,8 +283,8 @@ class TwitchConnection:
         with self.thread_lock:
             self.connection.send(f"{message}\r\n".encode("utf-8"))
 
-    def send_chat_message(self, message: str):
-        """Sends message to Twitch chat."""
+    def send_chat_message(self, message: str) -> bool:
+        """Sends message to Twitch chat. Returns True if the message was sent."""
 
         # updates bot message information
         self.update_last_bot_message(message)
@@ -250,6 +294,9 @@ class TwitchConnection:
             self.send_server_message(f"PRIVMSG #{self.chat} :{message}")
             self.last_bot_message_time = time.time()
             logging.info(f"Sent message: '{message}'")
+            return True
+
+        return False
 
     def update_last_bot_message(self, message: str):
         if message == self.last_bot_message:
@@ -346,14 +393,60 @@ class TwitchConnection:
         self.follower_emotes_enabled = not self.follower_emotes_enabled
         logging.info(f"Follower emote response enabled: {self.follower_emotes_enabled}")
 
+    def toggle_decayed_scoring(self):
+        """
+        Switches between queue and exponentially decayed NPC-scoring.
+        Decayed scoring is seeded with the queued messages. Queue scoring starts empty.
+        """
+        with self.messages_lock:
+            previous_messages = self.chat_messages
+
+            if isinstance(previous_messages, DecayedMessages):
+                chat_messages = Messages(previous_messages.get_queue_length())
+            else:
+                chat_messages = DecayedMessages(self.decay_half_life, self.decay_time_based)
+                chat_messages.set_queue_length(previous_messages.get_queue_length())
+
+            chat_messages.set_threshold(previous_messages.get_threshold())
+            chat_messages.set_min_same_word_count(previous_messages.get_min_same_word_count())
+
+            # adds queued messages from oldest to newest
+            if isinstance(chat_messages, DecayedMessages):
+                for user, words in reversed(previous_messages.message_queue):
+                    chat_messages.add(user, ' '.join(words))
+
+            self.chat_messages = chat_messages
+            logging.info(f"Decayed NPC-scoring enabled: {self.is_decayed_scoring()}")
+
+    def is_decayed_scoring(self) -> bool:
+        return isinstance(self.chat_messages, DecayedMessages)
+
+    def set_decay_half_life(self, half_life: int, time_based: bool = False):
+        if half_life < 1:
+            raise ValueError("Half-life has to be positive")
+
+        with self.messages_lock:
+            self.decay_half_life = half_life
+            self.decay_time_based = time_based
+            if self.is_decayed_scoring():
+                self.chat_messages.set_half_life(half_life, time_based)
+
+    def get_decay_half_life(self) -> int:
+        return self.decay_half_life
+
+    def is_decay_time_based(self) -> bool:
+        return self.decay_time_based
+
     def set_queue_length(self, length: int):
-        self.chat_messages.set_queue_length(length)
+        with self.messages_lock:
+            self.chat_messages.set_queue_length(length)
 
     def get_queue_length(self) -> int:
         return self.chat_messages.get_queue_length()
 
     def set_min_same_word_count(self, count: int):
-        self.chat_messages.set_min_same_word_count(count)
+        with self.messages_lock:
+            self.chat_messages.set_min_same_word_count(count)
 
     def get_min_same_word_count(self) -> int:
         return self.chat_messages.get_min_same_word_count()
@@ -376,11 +469,138 @@ class TwitchConnection:
     def get_min_bot_message_interval(self) -> int:
         return self.min_message_interval
 
+    def get_state(self) -> dict:
+        """Returns settings and message state as plain data for snapshots."""
+        with self.messages_lock:
+            return {
+                "min_message_interval": self.min_message_interval,
+                "npc_response_enabled": self.npc_response_enabled,
+                "max_same_message_count": self.max_same_message_count,
+                "sub_emotes_enabled": self.sub_emotes_enabled,
+                "follower_emotes_enabled": self.follower_emotes_enabled,
+                "decay_half_life": self.decay_half_life,
+                "decay_time_based": self.decay_time_based,
+                "last_bot_message": self.last_bot_message,
+                "same_message_count": self.same_message_count,
+                "last_bot_message_time": self.last_bot_message_time,
+                "messages": self.chat_messages.get_state(),
+            }
+
+    def set_state(self, state: dict):
+        """Restores settings and message state from a snapshot."""
+        with self.messages_lock:
+            self.min_message_interval = state.get("min_message_interval", self.min_message_interval)
+            self.npc_response_enabled = state.get("npc_response_enabled", self.npc_response_enabled)
+            self.max_same_message_count = state.get("max_same_message_count", self.max_same_message_count)
+            self.sub_emotes_enabled = state.get("sub_emotes_enabled", self.sub_emotes_enabled)
+            self.follower_emotes_enabled = state.get("follower_emotes_enabled", self.follower_emotes_enabled)
+            self.decay_half_life = state.get("decay_half_life", self.decay_half_life)
+            self.decay_time_based = state.get("decay_time_based", self.decay_time_based)
+            self.last_bot_message = state.get("last_bot_message", self.last_bot_message)
+            self.same_message_count = state.get("same_message_count", self.same_message_count)
+            self.last_bot_message_time = state.get("last_bot_message_time", self.last_bot_message_time)
+
+            # restores the scoring mode that was in use
+            messages_state = state.get("messages", {})
+            if messages_state.get("mode") == DecayedMessages.MODE:
+                self.chat_messages = DecayedMessages(self.decay_half_life, self.decay_time_based)
+            else:
+                self.chat_messages = Messages()
+            self.chat_messages.set_state(messages_state)
+
+    def save_snapshot(self):
+        """Stops background snapshots and saves the final state."""
+        self.snapshot.stop()
+
     def sleep_and_disconnect(self):     # TODO delete
         time.sleep(30)
         self.disconnect()
 
 
+class ChatCommand:
+    """
+    Chat-side command with per-user & global cooldowns.
+    If the command has a values function, the reply is formatted from its values
+    and reused for cache_time seconds as long as the values stay the same.
+    """
+
+    def __init__(self, function, help_text, values_function = None, user_cooldown = 0, global_cooldown = 0, cache_time = 0):
+        self.function = function
+        self.help_text = help_text
+        self.values_function = values_function
+        self.user_cooldowns = UserCooldowns(user_cooldown)
+        self.global_cooldown = global_cooldown
+        self.last_used_time = 0
+        self.cache_time = cache_time
+        self.cached_values = None
+        self.cached_reply = None
+        self.cached_time = 0
+
+    def execute(self, user: str) -> str | None:
+        """Returns reply, None if the command is on cooldown. Cooldowns start only when calling start_cooldowns."""
+        now = time.time()
+
+        if now < self.last_used_time + self.global_cooldown:
+            return None
+        if self.user_cooldowns.is_on_cooldown(user, now):
+            return None
+
+        if self.values_function is None:
+            return self.function()
+
+        # uses cached reply if the formatted values haven't changed
+        values = self.values_function()
+        if values == self.cached_values and now < self.cached_time + self.cache_time:
+            return self.cached_reply
+
+        self.cached_reply = self.function(*values)
+        self.cached_values = values
+        self.cached_time = now
+        return self.cached_reply
+
+    def start_cooldowns(self, user: str):
+        """Starts global & user's cooldowns, called once the reply is actually sent."""
+        now = time.time()
+        self.last_used_time = now
+        self.user_cooldowns.start(user, now)
+
+    def get_help_text(self):
+        return self.help_text
+
+
+class UserCooldowns:
+    """
+    Cooldown expiry times by user.
+    Cooldown is the same for everyone, so insertion order is also expiry order
+    and expired users can be dropped from the front on every check.
+    """
+
+    def __init__(self, cooldown: int):
+        self.cooldown = cooldown
+        self.expiry_times: OrderedDict[str, float] = OrderedDict()
+
+    def is_on_cooldown(self, user: str, now: float) -> bool:
+        if self.cooldown <= 0:
+            return False
+
+        # drops expired cooldowns
+        while self.expiry_times:
+            _, expiry_time = next(iter(self.expiry_times.items()))
+            if now < expiry_time:
+                break
+            self.expiry_times.popitem(last=False)
+
+        return user in self.expiry_times
+
+    def start(self, user: str, now: float):
+        if self.cooldown <= 0:
+            return
+
+        # moves to the end so that the order stays the expiry order
+        self.expiry_times.pop(user, None)
+        self.expiry_times[user] = now + self.cooldown
+
+
 class TwitchConnectionError(Exception):
     pass
 
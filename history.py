@@ -0,0 +1,264 @@
+import os
+import mmap
+import struct
+import threading
+import time
+from bisect import bisect_right
+
+class NPCHistory:
+    """
+    Append-only time series of NPC-meter, NPC-word, unique chatters and NPC-alerts of a channel.
+
+    Records are fixed width so that they can be read straight from a memory-mapped file.
+    NPC-words are stored once to a word file and referred by their line number.
+    Records are grouped to blocks of INDEX_STRIDE records. Every complete block has an index entry
+    with its time span, peak record and alert count, so time ranges are found quickly
+    and peak queries only read records of blocks that are partially inside the range.
+    """
+
+    RECORD              = struct.Struct("<dfIIB3x")     # timestamp, npc_meter, npc_word id, unique chatters, alert
+    INDEX_ENTRY         = struct.Struct("<ddQQfI")      # first & last timestamp, first & peak record number, peak npc_meter, alerts
+    INDEX_STRIDE        = 1024      # records in a block
+    FLUSH_INTERVAL      = 5         # seconds between flushing buffered records to disk
+    DEFAULT_DIRECTORY   = "history"
+
+    def __init__(self, channel: str, directory: str = None):
+        self.path = os.path.join(directory or os.environ.get("HISTORY_DIRECTORY", self.DEFAULT_DIRECTORY), channel or "unknown")
+        os.makedirs(self.path, exist_ok=True)
+        self.records_path = os.path.join(self.path, "records.bin")
+        self.index_path = os.path.join(self.path, "index.bin")
+        self.words_path = os.path.join(self.path, "words.txt")
+        self.lock = threading.Lock()
+        self.last_flush_time = time.time()
+
+        self.load_words()
+        self.record_count = self.load_records()
+        self.load_index()
+
+        self.words_file = open(self.words_path, "a", encoding="utf-8")
+        self.records_file = open(self.records_path, "ab")
+        self.index_file = open(self.index_path, "ab")
+
+    def load_words(self):
+        self.words = []
+        if os.path.exists(self.words_path):
+            with open(self.words_path, "r", encoding="utf-8") as file:
+                self.words = file.read().split('\n')[:-1]
+        self.word_ids = {word: word_id for word_id, word in enumerate(self.words)}
+
+    def load_records(self) -> int:
+        """Returns the record count. Cuts off a partially written last record."""
+        if not os.path.exists(self.records_path):
+            return 0
+
+        size = os.path.getsize(self.records_path)
+        whole_size = size - size % self.RECORD.size
+        if whole_size < size:
+            os.truncate(self.records_path, whole_size)
+
+        return whole_size // self.RECORD.size
+
+    def load_index(self):
+        """
+        Reads the index and rebuilds it if it doesn't match the records.
+        Aggregates the incomplete last block from its records.
+        """
+        self.blocks = []            # index entries of complete blocks
+        self.block_timestamps = []  # first timestamps of complete blocks, for bisecting
+        self.open_block = None      # [first & last timestamp, first & peak record number, peak npc_meter, alerts] of incomplete block
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as file:
+                data = file.read()
+            if len(data) % self.INDEX_ENTRY.size == 0:
+                self.blocks = list(self.INDEX_ENTRY.iter_unpack(data))
+
+        complete_count = self.record_count // self.INDEX_STRIDE
+        index_valid = len(self.blocks) == complete_count and all(
+            block[2] == number * self.INDEX_STRIDE for number, block in enumerate(self.blocks)
+        )
+        if 0 < self.record_count:
+            with open(self.records_path, "rb") as records_file, mmap.mmap(records_file.fileno(), 0, access=mmap.ACCESS_READ) as records:
+                # rebuilds from the records
+                if not index_valid:
+                    self.blocks = [
+                        tuple(self.aggregate_block(records, first, first + self.INDEX_STRIDE))
+                        for first in range(0, complete_count * self.INDEX_STRIDE, self.INDEX_STRIDE)
+                    ]
+                if complete_count * self.INDEX_STRIDE < self.record_count:
+                    self.open_block = self.aggregate_block(records, complete_count * self.INDEX_STRIDE, self.record_count)
+        else:
+            self.blocks = []
+
+        if not index_valid:
+            with open(self.index_path, "wb") as index_file:
+                for block in self.blocks:
+                    index_file.write(self.INDEX_ENTRY.pack(*block))
+
+        self.block_timestamps = [block[0] for block in self.blocks]
+
+    def aggregate_block(self, data: mmap.mmap, first: int, last: int) -> list:
+        """Aggregates records from first up to last record number to a block."""
+        block = None
+        for record_number in range(first, last):
+            timestamp, npc_meter, _, _, npc_alert = self.RECORD.unpack_from(data, record_number * self.RECORD.size)
+            block = self.add_to_block(block, record_number, timestamp, npc_meter, npc_alert)
+        return block
+
+    def add_to_block(self, block: list, record_number: int, timestamp: float, npc_meter: float, npc_alert: bool) -> list:
+        if block is None:
+            return [timestamp, timestamp, record_number, record_number, npc_meter, int(npc_alert)]
+
+        block[1] = timestamp
+        if block[4] < npc_meter:
+            block[3] = record_number
+            block[4] = npc_meter
+        block[5] += npc_alert
+        return block
+
+    def append(self, timestamp: float, npc_meter: float, npc_word: str, unique_chatters: int, npc_alert: bool):
+        """Appends a record. Records are expected in time order."""
+        with self.lock:
+            record = self.RECORD.pack(timestamp, npc_meter, self.get_word_id(npc_word), unique_chatters, npc_alert)
+            self.records_file.write(record)
+
+            # aggregates with the stored precision so that the peak matches its record
+            npc_meter = self.RECORD.unpack(record)[1]
+            self.open_block = self.add_to_block(self.open_block, self.record_count, timestamp, npc_meter, npc_alert)
+            self.record_count += 1
+
+            # complete block goes to index
+            if self.record_count % self.INDEX_STRIDE == 0:
+                block = tuple(self.open_block)
+                self.index_file.write(self.INDEX_ENTRY.pack(*block))
+                self.blocks.append(block)
+                self.block_timestamps.append(block[0])
+                self.open_block = None
+
+            if self.last_flush_time + self.FLUSH_INTERVAL <= time.time():
+                self.flush()
+
+    def get_word_id(self, word: str) -> int:
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.words.append(word)
+            self.word_ids[word] = word_id
+            self.words_file.write(f"{word}\n")
+        return word_id
+
+    def flush(self):
+        """Writes buffered words, records and index entries to disk, in that order."""
+        self.words_file.flush()
+        self.records_file.flush()
+        self.index_file.flush()
+        self.last_flush_time = time.time()
+
+    def close(self):
+        with self.lock:
+            if self.records_file.closed:
+                return
+            self.flush()
+            self.words_file.close()
+            self.records_file.close()
+            self.index_file.close()
+
+    def snapshot_counts(self) -> tuple[int, int]:
+        """Flushes and returns record & complete block counts. Reading up to them doesn't need the lock."""
+        with self.lock:
+            if not self.records_file.closed:
+                self.flush()
+            return self.record_count, len(self.blocks)
+
+    def read_record(self, data: mmap.mmap, record_number: int) -> tuple[float, float, str, int, bool]:
+        timestamp, npc_meter, word_id, unique_chatters, npc_alert = self.RECORD.unpack_from(data, record_number * self.RECORD.size)
+        npc_word = self.words[word_id] if word_id < len(self.words) else ""
+        return timestamp, npc_meter, npc_word, unique_chatters, bool(npc_alert)
+
+    def records(self, start: float, end: float):
+        """Yields (timestamp, npc_meter, npc_word, unique chatters, npc_alert) records between start and end."""
+        record_count, block_count = self.snapshot_counts()
+        if record_count < 1:
+            return
+
+        with open(self.records_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for record_number in range(self.find_first(data, start, record_count, block_count), record_count):
+                record = self.read_record(data, record_number)
+                if end < record[0]:
+                    break
+                yield record
+
+    def find_first(self, data: mmap.mmap, start: float, record_count: int, block_count: int) -> int:
+        """Finds the first record at or after start: index first, then binary search inside the block."""
+        block = max(0, bisect_right(self.block_timestamps, start, 0, block_count) - 1)
+        low = block * self.INDEX_STRIDE
+        # the last complete block is searched together with the incomplete block after it
+        high = low + self.INDEX_STRIDE if block + 1 < block_count else record_count
+
+        while low < high:
+            middle = (low + high) // 2
+            if self.RECORD.unpack_from(data, middle * self.RECORD.size)[0] < start:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def aggregate(self, start: float, end: float, bucket_of) -> dict:
+        """
+        Returns {bucket: [peak record, alert count]} of records between start and end.
+        Complete blocks inside the range and a single bucket are answered from the index, others are read record by record.
+        """
+        record_count, block_count = self.snapshot_counts()
+        buckets = {}
+        if record_count < 1:
+            return buckets
+
+        with open(self.records_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            first_block = max(0, bisect_right(self.block_timestamps, start, 0, block_count) - 1)
+            last_block = (record_count - 1) // self.INDEX_STRIDE
+
+            for block_number in range(first_block, last_block + 1):
+                first_record = block_number * self.INDEX_STRIDE
+
+                if block_number < block_count:
+                    first_timestamp, last_timestamp, _, peak_record, _, alert_count = self.blocks[block_number]
+                    if last_timestamp < start:
+                        continue
+                    if end < first_timestamp:
+                        break
+
+                    bucket = bucket_of(first_timestamp)
+                    if start <= first_timestamp and last_timestamp <= end and bucket == bucket_of(last_timestamp):
+                        self.add_to_bucket(buckets, bucket, self.read_record(data, peak_record), alert_count)
+                        continue
+
+                for record_number in range(first_record, min(first_record + self.INDEX_STRIDE, record_count)):
+                    record = self.read_record(data, record_number)
+                    if record[0] < start:
+                        continue
+                    if end < record[0]:
+                        break
+                    self.add_to_bucket(buckets, bucket_of(record[0]), record, int(record[4]))
+
+        return buckets
+
+    def add_to_bucket(self, buckets: dict, bucket, record: tuple, alert_count: int):
+        peak_and_alerts = buckets.get(bucket)
+        if peak_and_alerts is None:
+            buckets[bucket] = [record, alert_count]
+            return
+
+        if peak_and_alerts[0][1] < record[1]:
+            peak_and_alerts[0] = record
+        peak_and_alerts[1] += alert_count
+
+    def peak(self, start: float, end: float):
+        """Returns the record with the highest NPC-meter between start and end, None if there are no records."""
+        buckets = self.aggregate(start, end, lambda _: 0)
+        return buckets[0][0] if buckets else None
+
+    def peaks(self, start: float, end: float, bucket_length: int = 3600) -> list[tuple[float, tuple, int]]:
+        """Returns (bucket start, peak record, alert count) for every bucket with records between start and end."""
+        buckets = self.aggregate(start, end, lambda timestamp: timestamp - timestamp % bucket_length)
+        return [(bucket_start, peak, alert_count) for bucket_start, (peak, alert_count) in buckets.items()]
@@ -1,8 +1,15 @@
 from collections import deque, Counter
-from typing import Dict
+from heapq import heapify, heappush, heappop
+from array import array
+import itertools
+import sys
+from typing import Dict, Tuple
+import time
 
 class Messages:
     
+    MODE                = "window"  # scoring mode name stored to snapshots
+
     npc_meter           = 0         # % how much of queue messages are the most common word / word combo
     npc_alert           = False     # is NPC-meter over threshold (most common word has to also appear >1 times)
     npc_threshold       = 75        # >= what % NPC-meter sets alert
@@ -19,7 +26,14 @@ class Messages:
     def __init__(self, queue_length = 10):
         self.queue_length = queue_length
         self.message_queue = deque(maxlen=queue_length)
-        self.word_counts: Dict[str, Counter] = {}
+
+        # per-user state is stored in flat records by user id instead of per-user objects
+        self.user_ids: Dict[str, int] = {}              # users with messages in queue
+        self.free_user_ids: list[int] = []              # ids of reclaimed users, reused first
+        self.user_message_counts = array('I')           # messages in queue by user id
+        self.user_word_counts: list[tuple] = []         # (word, count, word, count, ...) by user id
+        self.word_chatters = Counter()                  # how many users have word in queue
+        self.word_frequencies: Dict[str, Counter] = {}  # word's user count by word count
 
     def add(self, user: str, message: str) -> bool:
         """
@@ -29,11 +43,11 @@ class Messages:
         if len(self.message_queue) == self.message_queue.maxlen:
             self.pop()
 
+        user = sys.intern(user)     # queued messages share the same user & word strings
         words = self.break_into_words(message)
 
         # adds words and their counters to user's word counts
-        user_word_counts = self.word_counts.setdefault(user, Counter())
-        user_word_counts += Counter(words)
+        self.count_words(user, words)
 
         # adds to queue
         self.message_queue.appendleft((user, words))
@@ -55,13 +69,80 @@ class Messages:
         user, words = self.message_queue.pop()
         
         # updates word counts
-        user_word_counts = self.word_counts.get(user, Counter())
-        user_word_counts -= Counter(words)
+        self.uncount_words(user, words)
+
+    def count_words(self, user: str, words: list[str]):
+        """Adds message words to user's word counts. Reuses a reclaimed user id for a new user."""
+        user_id = self.user_ids.get(user)
+        if user_id is None:
+            if self.free_user_ids:
+                user_id = self.free_user_ids.pop()
+            else:
+                user_id = len(self.user_message_counts)
+                self.user_message_counts.append(0)
+                self.user_word_counts.append(())
+            self.user_ids[user] = user_id
+
+        self.user_message_counts[user_id] += 1
+
+        word_counts = self.unpack_word_counts(self.user_word_counts[user_id])
+        for word, count in Counter(words).items():
+            previous_count = word_counts.get(word, 0)
+            word_counts[word] = previous_count + count
+            self.move_word_frequency(word, previous_count, previous_count + count)
+        self.user_word_counts[user_id] = self.pack_word_counts(word_counts)
+
+    def uncount_words(self, user: str, words: list[str]):
+        """Decreases message words from user's word counts. Reclaims user's id if user has no messages left."""
+        user_id = self.user_ids.get(user)
+        if user_id is None:
+            return
 
-        # removes from user word counts if it becomes empty
-        if len(user_word_counts) < 1:
-            self.word_counts.pop(user, None)
+        word_counts = self.unpack_word_counts(self.user_word_counts[user_id])
+        for word, count in Counter(words).items():
+            previous_count = word_counts.get(word, 0)
+            new_count = max(0, previous_count - count)
+            if new_count < 1:
+                word_counts.pop(word, None)
+            else:
+                word_counts[word] = new_count
+            self.move_word_frequency(word, previous_count, new_count)
+        self.user_word_counts[user_id] = self.pack_word_counts(word_counts)
+
+        # reclaims user if it has no messages left in queue
+        self.user_message_counts[user_id] -= 1
+        if self.user_message_counts[user_id] < 1:
+            del self.user_ids[user]
+            self.user_word_counts[user_id] = ()
+            self.free_user_ids.append(user_id)
+
+    def unpack_word_counts(self, packed: tuple) -> Dict[str, int]:
+        return dict(zip(packed[::2], packed[1::2]))
+
+    def pack_word_counts(self, word_counts: Dict[str, int]) -> tuple:
+        """Flattens word counts to (word, count, word, count, ...), which is much smaller than a dict."""
+        return tuple(itertools.chain.from_iterable(word_counts.items()))
+
+    def move_word_frequency(self, word: str, previous_count: int, new_count: int):
+        """Moves a user from previous word count to new word count in word's chatters & frequencies."""
+        if previous_count == new_count:
+            return
 
+        frequencies = self.word_frequencies.setdefault(word, Counter())
+        if 0 < previous_count:
+            frequencies[previous_count] -= 1
+            if frequencies[previous_count] < 1:
+                del frequencies[previous_count]
+        else:
+            self.word_chatters[word] += 1
+
+        if 0 < new_count:
+            frequencies[new_count] += 1
+        else:
+            self.word_chatters[word] -= 1
+            if self.word_chatters[word] < 1:
+                del self.word_chatters[word]
+                del self.word_frequencies[word]
 
     def update_messages_info(self):
         """Updates NPC-meter, NPC-message, NPC-word, NPC-word count, NPC-alert and unique chatters"""
@@ -72,13 +153,8 @@ class Messages:
 
     def update_npc_word(self):
         """most common word in queue, how many of the messages contain it and most common times it appears in messages"""
-        # counts all unique words
-        unique_words = Counter()
-        for user_word_counts in self.word_counts.values():
-            unique_words.update(user_word_counts.keys())
-
-        # ordered list of most common words and the counts
-        most_common = unique_words.most_common()
+        # ordered list of most common words and the counts (ties keep the word that has been in queue the longest first)
+        most_common = self.word_chatters.most_common()
 
         # finds most common word and its count
         self.npc_word, self.npc_word_count = most_common[0]
@@ -93,20 +169,13 @@ class Messages:
                     self.npc_word += f" {word}"
     
     def calculate_word_frequency(self, word: str) -> int:
-        """calculates how many times given word appears in user messages the most"""
-        word_counts = {}
-        for user_word_counts in self.word_counts.values():
-            word_count = user_word_counts.get(word, 0)
-
-            # adds count if over 0
-            if 0 < word_count:
-                word_counts[word_count] = word_counts.get(word_count, 0) + 1
-
-        return max(word_counts, key=word_counts.get)
+        """calculates how many times given word appears in user messages the most, ties go to the higher count"""
+        frequencies = self.word_frequencies[word]
+        return max(frequencies.items(), key=lambda frequency: (frequency[1], frequency[0]))[0]
 
     def update_npc_meter(self):
         """% of unique chatters' messages that contain the most common word"""
-        self.unique_chatters = len(self.word_counts)
+        self.unique_chatters = len(self.user_ids)
         self.npc_meter = (self.npc_word_count / self.unique_chatters) * 100
 
     def update_npc_message(self):
@@ -117,26 +186,40 @@ class Messages:
         """true if threshold and minimum same word count are exceeded"""
         self.npc_alert = self.npc_threshold <= self.npc_meter and self.min_same_word_count <= self.npc_word_count
 
-    def break_into_words(self, message: str):
-        return message.split()
+    def break_into_words(self, message: str) -> tuple[str, ...]:
+        return tuple(map(sys.intern, message.split()))
 
     def clear(self):
         """Clears messages, word counts and message related attributes."""
         self.message_queue.clear()
-        self.word_counts.clear()
+        self.user_ids.clear()
+        self.free_user_ids.clear()
+        self.user_message_counts = array('I')
+        self.user_word_counts.clear()
+        self.word_chatters.clear()
+        self.word_frequencies.clear()
         self.npc_alert = False
         self.npc_message = ""
         self.npc_meter = 0
 
     def set_queue_length(self, length: int):
         """
-        Clears messages and creates new deque.
-        Previously queued messages are cleared.
+        Resizes the queue in place.
+        Oldest messages are popped if the queue doesn't fit to the new length.
         """
-        self.clear()
-        self.message_queue = deque(maxlen=length)   # throws error if trying to set invalid
+        resized_queue = deque(maxlen=length)    # throws error if trying to set invalid
+
+        # pops oldest messages until the rest fit to the new queue
+        while length < len(self.message_queue):
+            self.pop()
+
+        resized_queue.extend(self.message_queue)
+        self.message_queue = resized_queue
         self.queue_length = length
 
+        if 0 < len(self.message_queue):
+            self.update_messages_info()
+
     def get_queue_length(self) -> int:
         return self.message_queue.maxlen
 
@@ -147,9 +230,11 @@ class Messages:
         return self.npc_threshold
 
     def set_min_same_word_count(self, count: int):
-        self.clear()
         self.min_same_word_count = count
 
+        if 0 < len(self.message_queue):
+            self.update_npc_alert()
+
     def get_min_same_word_count(self) -> int:
         return self.min_same_word_count
 
@@ -168,8 +253,289 @@ class Messages:
     def get_npc_word(self) -> str:
         return self.npc_word
 
+    def get_state(self) -> dict:
+        """Returns queued messages and settings as plain data for snapshots."""
+        return {
+            "mode": self.MODE,
+            "queue_length": self.queue_length,
+            "messages": list(self.message_queue),  # newest first
+            "npc_threshold": self.npc_threshold,
+            "min_same_word_count": self.min_same_word_count,
+        }
+
+    def set_state(self, state: dict):
+        """Restores queued messages and settings from a snapshot. Word counts are rebuilt from the messages."""
+        self.clear()
+        self.npc_threshold = state.get("npc_threshold", self.npc_threshold)
+        self.min_same_word_count = state.get("min_same_word_count", self.min_same_word_count)
+        self.queue_length = state.get("queue_length", self.queue_length)
+        self.message_queue = deque(maxlen=self.queue_length)
+
+        # adds from oldest to newest so that the queue keeps its order
+        for user, words in reversed(state.get("messages", [])[:self.queue_length]):
+            user = sys.intern(user)
+            words = tuple(map(sys.intern, words))
+            self.count_words(user, words)
+            self.message_queue.appendleft((user, words))
+
+        if 0 < len(self.message_queue):
+            self.update_messages_info()
+
+
+class DecayedMessages(Messages):
+    """
+    Alternative NPC-scoring where chatters' words decay exponentially by message count or time
+    instead of dropping out of a fixed size queue.
+
+    Decay is lazy: new weights are stored multiplied by a growing global scale factor,
+    so adding a message only touches its own words. Stored weights are renormalized
+    when the scale factor grows too large.
+    """
+
+    MODE                = "decayed"
+    RENORMALIZE_SCALE   = 2 ** 40   # scale factor at which stored weights are renormalized
+    MAX_DECAY_EXPONENT  = 64        # more half-lives than this at once forgets everything
+    MIN_WEIGHT          = 1e-3      # decayed weights under this are forgotten when renormalizing
+    HEAP_COMPACT_RATIO  = 4         # word heap is rebuilt when it has this many times more entries than words
+    HEAP_COMPACT_MIN    = 64        # word heap isn't rebuilt under this many entries
+
+    def __init__(self, half_life = 10, time_based = False):
+        super().__init__()
+        self.half_life = half_life      # messages (or seconds if time based) until weight halves
+        self.time_based = time_based
+        self.last_time = time.time()
+        self.scale = 1.0
+        self.npc_word_weight = 0.0
+        self.total_weight = 0.0                                         # sum of user weights
+        self.user_weights: Dict[str, float] = {}                        # weight of user's latest message
+        self.user_words: Dict[Tuple[str, str], Tuple[float, int]] = {}  # weight & count of user's latest use of word
+        self.word_weights: Dict[str, float] = {}                        # sum of users' weights for word
+        self.word_frequencies: Dict[str, Dict[int, float]] = {}         # word's weights by count in message
+        self.word_heap = []                                             # (-weight, word), stale entries skipped lazily
+
+    def add(self, user: str, message: str) -> bool:
+        """
+        Adds message with the weight of the current scale factor.
+        Replaces user's previous weight and previous weights of the same words, so each chatter counts once.
+        """
+        self.advance()
+        weight = self.scale
+        user = sys.intern(user)
+
+        self.total_weight += weight - self.user_weights.get(user, 0.0)
+        self.user_weights[user] = weight
+
+        for word, count in Counter(self.break_into_words(message)).items():
+            previous_weight, previous_count = self.user_words.get((user, word), (0.0, 0))
+            self.user_words[(user, word)] = (weight, count)
+
+            word_weight = self.word_weights.get(word, 0.0) + weight - previous_weight
+            self.word_weights[word] = word_weight
+            heappush(self.word_heap, (-word_weight, word))
+
+            frequencies = self.word_frequencies.setdefault(word, {})
+            if 0 < previous_count:
+                frequencies[previous_count] -= previous_weight
+            frequencies[count] = frequencies.get(count, 0.0) + weight
+
+        # drops piled up stale entries
+        if max(self.HEAP_COMPACT_MIN, self.HEAP_COMPACT_RATIO * len(self.word_weights)) < len(self.word_heap):
+            self.rebuild_word_heap()
+
+        self.update_messages_info()
+
+        return self.npc_alert
+
+    def advance(self):
+        """Grows the scale factor by elapsed messages or time. Renormalizes if it grows too large."""
+        if self.time_based:
+            now = time.time()
+            steps = max(0.0, now - self.last_time)
+            self.last_time = now
+        else:
+            steps = 1
+
+        exponent = steps / self.half_life
+
+        # everything stored has decayed to nothing
+        if self.MAX_DECAY_EXPONENT < exponent:
+            self.forget()
+            return
+
+        self.scale *= 2 ** exponent
+        if self.RENORMALIZE_SCALE <= self.scale:
+            self.renormalize()
+
+    def renormalize(self):
+        """Divides stored weights by the scale factor, forgets weights decayed under minimum and resets the scale."""
+        factor = 1 / self.scale
+        min_weight = self.MIN_WEIGHT
+
+        self.user_weights = {user: weight * factor for user, weight in self.user_weights.items() if min_weight <= weight * factor}
+        self.user_words = {
+            user_word: (weight * factor, count)
+            for user_word, (weight, count) in self.user_words.items()
+            if min_weight <= weight * factor
+        }
+        self.scale = 1.0
+        self.rebuild()
+
+    def rebuild(self):
+        """Recalculates word weights, frequencies, total weight and the word heap from user weights."""
+        self.word_weights = {}
+        self.word_frequencies = {}
+
+        for (_, word), (weight, count) in self.user_words.items():
+            self.word_weights[word] = self.word_weights.get(word, 0.0) + weight
+            frequencies = self.word_frequencies.setdefault(word, {})
+            frequencies[count] = frequencies.get(count, 0.0) + weight
+
+        self.total_weight = sum(self.user_weights.values())
+        self.rebuild_word_heap()
+
+    def rebuild_word_heap(self):
+        """Rebuilds the word heap from current word weights, without stale entries."""
+        self.word_heap = [(-weight, word) for word, weight in self.word_weights.items()]
+        heapify(self.word_heap)
+
+    def forget(self):
+        """Clears all weights and resets the scale factor."""
+        self.scale = 1.0
+        self.total_weight = 0.0
+        self.user_weights.clear()
+        self.user_words.clear()
+        self.word_weights.clear()
+        self.word_frequencies.clear()
+        self.word_heap.clear()
+
+    def top_words(self, ratio: float = 1.0) -> list[tuple[str, float]]:
+        """
+        Returns words with at least given ratio of the top word's weight, most common first.
+        Stale heap entries are dropped on the way and valid ones are pushed back.
+        """
+        top = []
+        seen = set()
+        while self.word_heap:
+            negative_weight, word = self.word_heap[0]
+
+            # stops when under the ratio of the top word
+            if top and -negative_weight < ratio * top[0][1]:
+                break
+
+            heappop(self.word_heap)
+            if word not in seen and self.word_weights.get(word) == -negative_weight:
+                seen.add(word)
+                top.append((word, -negative_weight))
+
+        for word, weight in top:
+            heappush(self.word_heap, (-weight, word))
+
+        return top
+
+    def update_npc_word(self):
+        """highest weighted word, its effective chatter count and most common times it appears in messages"""
+        top = self.top_words(self.SAME_WORD_THRESHOLD / 100)
+
+        # finds highest weighted word and its effective count
+        self.npc_word, self.npc_word_weight = top[0]
+        self.npc_word_count = self.npc_word_weight / self.scale
+
+        # finds how many times the highest weighted word appears the most
+        self.npc_word_mfc = self.calculate_word_frequency(self.npc_word)
+
+        # adds to the NPC-word if fits to thresholds (top words are already over same word threshold)
+        for word, _ in top[1:]:
+            if (self.SAME_FREQ_THRESHOLD / 100) <= (self.calculate_word_frequency(word) / self.npc_word_mfc):
+                self.npc_word += f" {word}"
+
+    def calculate_word_frequency(self, word: str) -> int:
+        """times given word appears in a message with the highest weight"""
+        frequencies = self.word_frequencies[word]
+        return max(frequencies, key=frequencies.get)
+
+    def update_npc_meter(self):
+        """% of effective chatter weight that contains the highest weighted word"""
+        self.unique_chatters = round(self.total_weight / self.scale)
+        self.npc_meter = (self.npc_word_weight / self.total_weight) * 100
+
+    def update_npc_alert(self):
+        """
+        true if threshold and minimum same word count are exceeded.
+        Effective word count is rounded, so recent chatters count as whole chatters
+        but leftover weight of old ones doesn't add an extra chatter.
+        """
+        effective_word_count = round(self.npc_word_count)
+        self.npc_alert = self.npc_threshold <= self.npc_meter and self.min_same_word_count <= effective_word_count
+
+    def set_min_same_word_count(self, count: int):
+        self.min_same_word_count = count
+
+        if 0 < len(self.user_weights):
+            self.update_npc_alert()
+
+    def clear(self):
+        """Clears weights and message related attributes."""
+        super().clear()
+        self.forget()
+
+    def set_half_life(self, half_life: int, time_based: bool = False):
+        """Sets how many messages (or seconds if time based) it takes for a weight to halve."""
+        if half_life <= 0:
+            raise ValueError("Half-life has to be positive")
+
+        self.half_life = half_life
+        if time_based and not self.time_based:
+            self.last_time = time.time()
+        self.time_based = time_based
+
+    def get_half_life(self) -> int:
+        return self.half_life
+
+    def is_time_based(self) -> bool:
+        return self.time_based
+
+    def get_state(self) -> dict:
+        """Returns weights and settings as plain data for snapshots."""
+        state = super().get_state()
+        state.update({
+            "half_life": self.half_life,
+            "time_based": self.time_based,
+            "last_time": self.last_time,
+            "scale": self.scale,
+            "user_weights": dict(self.user_weights),
+            "user_words": dict(self.user_words),
+        })
+        return state
+
+    def set_state(self, state: dict):
+        """Restores weights and settings from a snapshot. Word weights are rebuilt from the user weights."""
+        super().set_state(state)
+        self.half_life = state.get("half_life", self.half_life)
+        self.time_based = state.get("time_based", self.time_based)
+        self.last_time = state.get("last_time", self.last_time)
+        self.scale = state.get("scale", self.scale)
+        self.user_weights = dict(state.get("user_weights", {}))
+        self.user_words = dict(state.get("user_words", {}))
+        self.rebuild()
+
+        if 0 < len(self.user_weights):
+            self.update_messages_info()
+
 
 if __name__ == "__main__":
+    # two chatters in a row with the same word alert in both scoring modes
+    for two_chatters in (Messages(5), DecayedMessages(10)):
+        two_chatters.add("first", "KEKW")
+        assert two_chatters.add("second", "KEKW"), f"{two_chatters.MODE} scoring didn't alert"
+
+    # one chatter spamming after an old use of the same word doesn't alert in either scoring mode
+    for lone_spammer in (Messages(10), DecayedMessages(10)):
+        lone_spammer.add("first", "KEKW")
+        for index in range(100):
+            lone_spammer.add(f"chatter{index}", f"hello{index}")
+        for _ in range(200):
+            assert not lone_spammer.add("spammer", "KEKW"), f"{lone_spammer.MODE} scoring alerted on one chatter"
+
     messages = Messages(5)
 
     if messages.add("user123", "KEKW KEKW KEKW ICANT"):
@@ -0,0 +1,86 @@
+import os
+import pickle
+import threading
+import logging
+
+class Snapshot:
+    """
+    Saves and loads binary snapshots of the connection state (message queue, word counts and settings).
+    Snapshots are written atomically so that a crash mid-write doesn't corrupt the previous snapshot.
+    """
+
+    VERSION         = 1
+    DEFAULT_PATH    = "npcchatter.snapshot"
+    SAVE_INTERVAL   = 60        # seconds between background saves
+
+    def __init__(self, connection, path: str = None, interval: int = None):
+        self.connection = connection
+        self.path = path or os.environ.get("SNAPSHOT_FILE", self.DEFAULT_PATH)
+        self.interval = interval or self.SAVE_INTERVAL
+        self.stop_event = threading.Event()
+        self.save_thread = None
+
+    def save(self):
+        """Writes the current state to a temporary file and replaces the previous snapshot with it."""
+        data = {"version": self.VERSION, "channel": self.connection.chat, "state": self.connection.get_state()}
+        temporary_path = f"{self.path}.tmp"
+
+        try:
+            with open(temporary_path, "wb") as file:
+                pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, self.path)
+        except OSError as exception:
+            logging.error(f"Problems saving snapshot: {exception}")
+
+    def load(self) -> bool:
+        """Restores state from the snapshot file. Returns True if a snapshot was loaded."""
+        if not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, "rb") as file:
+                data = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as exception:
+            logging.error(f"Problems loading snapshot: {exception}")
+            return False
+
+        if not isinstance(data, dict) or data.get("version") != self.VERSION:
+            logging.warning("Ignored snapshot from an incompatible version")
+            return False
+
+        if data.get("channel") != self.connection.chat:
+            logging.warning(f"Ignored snapshot of another channel #{data.get('channel')}")
+            return False
+
+        # restores the fresh state if the snapshot state is malformed
+        fresh_state = self.connection.get_state()
+        try:
+            self.connection.set_state(data["state"])
+        except (KeyError, TypeError, ValueError, AttributeError) as exception:
+            logging.warning(f"Ignored malformed snapshot: {exception}")
+            self.connection.set_state(fresh_state)
+            return False
+
+        logging.info(f"Loaded snapshot from '{self.path}'")
+        return True
+
+    def start(self):
+        """Starts saving snapshots periodically in a separate thread."""
+        if self.save_thread is not None and self.save_thread.is_alive():
+            return
+
+        self.stop_event.clear()
+        self.save_thread = threading.Thread(target=self.save_periodically, daemon=True)
+        self.save_thread.start()
+
+    def stop(self):
+        """Stops periodic saving and saves one last snapshot."""
+        self.stop_event.set()
+        if self.save_thread is not None:
+            self.save_thread.join()
+            self.save_thread = None
+        self.save()
+
+    def save_periodically(self):
+        while not self.stop_event.wait(self.interval):
+            self.save()
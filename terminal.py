@@ -1,5 +1,6 @@
 from connection import *
 import logging
+import time
 
 # sets up logging configuration
 logging.basicConfig(level=logging.INFO, format="%(message)s")
@@ -10,12 +11,15 @@ class NPCChatter:
         self.connection = connection
         self.commands = {
             "CON": NPCCommand(self.connect, "connects to chat"),
+            "DEC": NPCCommand(self.toggle_decayed_scoring, "toggles exponentially decayed npc-scoring on/off"),
             "DISC": NPCCommand(self.disconnect, "disconnects from chat"),
             "EXIT": NPCCommand(self.exit, "closes the NPCChatter"),
             "FOL": NPCCommand(self.toggle_follower_emote, "toggles follower emote responses on/off"),
             "SUB": NPCCommand(self.toggle_sub_response, "toggles sub emote responses on/off"),
             "INFO": NPCCommand(self.print_info, "lists current attribute values"),
             "HELP": NPCCommand(self.print_help, "lists all of the commands with help texts"),
+            "HL": NPCCommand(self.set_half_life, "sets decayed scoring half-life in messages ('s' after value for seconds)"),
+            "HIST": NPCCommand(self.print_history, "lists hourly npc-meter peaks from the last given hours (default 24)"),
             "HS": NPCCommand(self.set_history_size, "set history size, how many messages are stored until forgetting"),
             "MAXM": NPCCommand(self.set_max_same_message, "sets the maximum of the same bot message"),
             "MINI": NPCCommand(self.set_min_interval, "sets the minimum interval between bot messages"),
@@ -32,6 +36,18 @@ class NPCChatter:
     def set_history_size(self, *args):
         self.connection.set_queue_length(self.get_first_num_attr(*args))
         logging.info(f"History size set to [{self.connection.get_queue_length()}]")
+        if self.connection.is_decayed_scoring():
+            logging.warning("History size has no effect while decayed scoring is on, it's used when switching back")
+
+    def set_half_life(self, *args):
+        half_life = self.get_first_num_attr(*args)
+        time_based = 1 < len(args) and args[1].upper() == 'S'
+        self.connection.set_decay_half_life(half_life, time_based)
+        logging.info(f"Half-life set to [{self.format_half_life()}]")
+
+    def format_half_life(self) -> str:
+        unit = "seconds" if self.connection.is_decay_time_based() else "messages"
+        return f"{self.connection.get_decay_half_life()} {unit}"
 
     def set_threshold(self, *args):
         self.connection.set_threshold(self.get_first_num_attr(*args))
@@ -48,6 +64,9 @@ class NPCChatter:
     def toggle_response(self, *_):
         self.connection.toggle_npc_response()
 
+    def toggle_decayed_scoring(self, *_):
+        self.connection.toggle_decayed_scoring()
+
     def toggle_sub_response(self, *_):
         self.connection.toggle_sub_emotes()
 
@@ -71,10 +90,26 @@ class NPCChatter:
             ("Maximum bot same word count", str(self.connection.get_max_same_bot_message_count())),
             ("Minimum bot message interval", str(self.connection.get_min_bot_message_interval())),
             ("History size", str(self.connection.get_queue_length())),
+            ("Decayed scoring", str(self.connection.is_decayed_scoring())),
+            ("Half-life", self.format_half_life()),
             ("Threshold", str(self.connection.get_threshold()))
         ]
         self.print_text_box("Chatter settings info", attributes)
 
+    def print_history(self, *args):
+        hours = self.get_first_num_attr(*args) if 0 < len(args) else 24
+        peaks = self.connection.get_history_peaks(hours)
+        if len(peaks) < 1:
+            logging.info(f"No history from the last {hours} hours")
+            return
+
+        attributes = []
+        for hour, (_, npc_meter, npc_word, unique_chatters, _), alert_count in peaks:
+            formatted_hour = time.strftime("%Y-%m-%d %H:%M", time.localtime(hour))
+            attributes.append((formatted_hour, f"{npc_meter:.1f}% '{npc_word}' ({unique_chatters} chatters, {alert_count} alerts)"))
+
+        self.print_text_box(f"NPC-meter peaks of last {hours} hours", attributes)
+
     def print_help(self, *_):
         attributes = []
         for command, command_function in self.commands.items():
@@ -123,36 +158,48 @@ class NPCChatter:
         self.disconnect()
         exit()
 
+    def close(self):
+        """Saves the final snapshot and closes history. Run on every exit path."""
+        self.connection.save_snapshot()
+        self.connection.close_history()
+
     def run(self):
         logging.info(f"Welcome to NPC-terminal. 'EXIT' to close, 'HELP' for list of commands.")
 
-        while True:
-            try:
-                # takes input, removes unnecessary whitespaces, splits
-                user_input = input("> ").strip().split()
-
-                # skips empty lines
-                if len(user_input) < 1:
-                    continue
-
-                user_command = user_input[0].upper()
-                user_arguments = user_input[1:]
-
-                # looks for command name and executes if found
-                if user_command in self.commands:
-                    command = self.commands.get(user_command)
-                    command.execute(*user_arguments)
-                else:
-                    logging.warning(f"Didn't find any commands named '{user_command}'!")
-
-            except NPCError as error:
-                logging.error(error)
-            
-            except TwitchConnectionError as error:
-                logging.error(error)
-
-            except Exception as error:
-                logging.error(f"Unexpected error: {error}")
+        try:
+            while True:
+                try:
+                    # takes input, removes unnecessary whitespaces, splits
+                    user_input = input("> ").strip().split()
+
+                    # skips empty lines
+                    if len(user_input) < 1:
+                        continue
+
+                    user_command = user_input[0].upper()
+                    user_arguments = user_input[1:]
+
+                    # looks for command name and executes if found
+                    if user_command in self.commands:
+                        command = self.commands.get(user_command)
+                        command.execute(*user_arguments)
+                    else:
+                        logging.warning(f"Didn't find any commands named '{user_command}'!")
+
+                # Ctrl-C & Ctrl-D close like EXIT
+                except (KeyboardInterrupt, EOFError):
+                    self.exit()
+
+                except NPCError as error:
+                    logging.error(error)
+                
+                except TwitchConnectionError as error:
+                    logging.error(error)
+
+                except Exception as error:
+                    logging.error(f"Unexpected error: {error}")
+        finally:
+            self.close()
 
 
 class NPCCommand: